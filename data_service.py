@@ -0,0 +1,595 @@
+"""Read-only HTTP data service over the reporting views in sql/views.sql.
+
+Serves each view as Arrow IPC or JSON, with optional top-N / filter
+parameters, so notebooks don't need direct access to retail_db.
+
+    GET /views                          -> list of available views
+    GET /views/<name>                   -> rows of a view
+        ?format=json|arrow              (or Accept: application/vnd.apache.arrow.stream)
+        ?columns=a,b                    select a subset of columns
+        ?order_by=col&order=asc|desc    sort
+        ?limit=N                        top-N
+        ?<col>=value[&<col>=value2]     equality / IN filter on any column,
+                                        compared as the column's type
+    GET /stats                          -> cache and coalescing counters
+
+Responses carry an ETag derived from the data version (OID and write counters
+of the inventory table plus the view definitions), so If-None-Match returns 304
+without touching the view. Results are held in an in-process LRU cache bounded
+by bytes, and identical concurrent requests are coalesced into one query.
+
+The data version is eventually consistent: the write counters in
+pg_stat_user_tables are not transactional and can lag a commit (typically up
+to a second), and the service re-reads them at most every --version-ttl
+seconds. If the counters are unavailable (track_counts = off) the version
+instead rolls over every UNTRACKED_VERSION_TTL seconds.
+
+Run:
+    PGPASSWORD=... python data_service.py --port 8600
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from datetime import date, datetime
+from decimal import Decimal
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import psycopg2
+import psycopg2.errors
+import psycopg2.pool
+import pyarrow as pa
+from psycopg2 import sql
+
+# Views defined in sql/views.sql (same set the dashboard loads)
+VIEWS = [
+    'category_performance',
+    'store_performance',
+    'top_sellers',
+    'top_revenue_products',
+    'cluster_summary',
+    'stock_risk_dashboard',
+    'revenue_curve',
+    'performance_ranked',
+]
+
+# Table the views are built on; its write counters drive the data version
+SOURCE_TABLE = 'inventory'
+
+# Version lifetime in seconds when the table's write counters aren't tracked
+UNTRACKED_VERSION_TTL = 30
+
+ARROW_MIME = 'application/vnd.apache.arrow.stream'
+JSON_MIME = 'application/json'
+
+# Arrow types for Postgres type OIDs seen in the views; anything else is sent
+# as text. NUMERIC has no typmod after ROUND(), so it maps to float64.
+PG_ARROW_TYPES = {
+    16: pa.bool_(),                       # bool
+    20: pa.int64(),                       # int8
+    21: pa.int16(),                       # int2
+    23: pa.int32(),                       # int4
+    700: pa.float32(),                    # float4
+    701: pa.float64(),                    # float8
+    1700: pa.float64(),                   # numeric
+    25: pa.string(),                      # text
+    1042: pa.string(),                    # bpchar
+    1043: pa.string(),                    # varchar
+    1082: pa.date32(),                    # date
+    1114: pa.timestamp('us'),             # timestamp
+    1184: pa.timestamp('us', tz='UTC'),   # timestamptz
+}
+
+RESERVED_PARAMS = {'format', 'columns', 'order_by', 'order', 'limit'}
+
+# Upper bound on ?limit= (the largest view has one row per inventory record)
+MAX_LIMIT = 1000000
+
+
+def db_config():
+    """Connection settings from the environment (never hard-coded)"""
+    return {
+        'dbname': os.environ.get('PGDATABASE', 'retail_db'),
+        'user': os.environ.get('PGUSER', 'postgres'),
+        'password': os.environ.get('PGPASSWORD'),
+        'host': os.environ.get('PGHOST', 'localhost'),
+        'port': os.environ.get('PGPORT', '5432'),
+        # Read-only sessions, and keep runaway queries from hurting dashboard latency
+        'options': '-c default_transaction_read_only=on -c statement_timeout=%d'
+                   % int(os.environ.get('SERVICE_STATEMENT_TIMEOUT_MS', '30000')),
+    }
+
+
+class BadRequest(Exception):
+    """Client error, reported as HTTP 400"""
+
+
+class NotFound(Exception):
+    """Unknown resource, reported as HTTP 404"""
+
+
+class LRUCache:
+    """Thread-safe LRU cache of byte payloads, evicting by total size"""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._items = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            value = self._items.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def peek(self, key):
+        """Look up a key without touching the hit/miss counters"""
+        with self._lock:
+            return self._items.get(key)
+
+    def put(self, key, value):
+        size = len(value)
+        # Never let one oversized result flush the whole cache
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old)
+            self._items[key] = value
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, evicted = self._items.popitem(last=False)
+                self._bytes -= len(evicted)
+                self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._items),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+class SingleFlight:
+    """Coalesce concurrent calls with the same key into one execution"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._inflight = {}
+        self.coalesced = 0
+
+    def do(self, key, fn):
+        with self._lock:
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._inflight[key] = future
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            return future.result()
+
+        try:
+            future.set_result(fn())
+        except BaseException as exc:
+            future.set_exception(exc)
+        finally:
+            with self._lock:
+                del self._inflight[key]
+        return future.result()
+
+
+class DataService:
+    """Query, serialize and cache view results"""
+
+    def __init__(self, pool, cache, version_ttl=2.0):
+        self.pool = pool
+        self.cache = cache
+        self.flight = SingleFlight()
+        self.version_ttl = version_ttl
+        # getconn() raises instead of waiting when the pool is exhausted, so
+        # queue callers here to cap Postgres load without rejecting requests.
+        # One connection is reserved for the version probe so it never waits
+        # behind slow view queries.
+        self._slots = threading.BoundedSemaphore(pool.maxconn - 1)
+        self._probe_slot = threading.BoundedSemaphore(1)
+        self.requests = 0
+        self.queries = 0
+        self._counters_lock = threading.Lock()
+        self._version = None
+        self._version_checked = 0.0
+        self._version_lock = threading.Lock()
+        self._warned_untracked = False
+        self._column_types = {}
+
+    def _execute(self, query, params=None, slots=None):
+        with slots or self._slots:
+            conn = self.pool.getconn()
+            try:
+                conn.autocommit = True
+                with conn.cursor() as cur:
+                    cur.execute(query, params)
+                    fields = [(desc[0], desc[1]) for desc in cur.description]
+                    rows = cur.fetchall()
+            except psycopg2.Error:
+                conn.rollback()
+                raise
+            finally:
+                self.pool.putconn(conn)
+        return fields, rows
+
+    def data_version(self):
+        """Version string that changes whenever the view output can change"""
+        if self._version is not None and time.monotonic() - self._version_checked < self.version_ttl:
+            return self._version
+        # One thread refreshes; the rest keep serving the current version
+        # rather than queueing behind the probe (only the first call waits)
+        if not self._version_lock.acquire(blocking=self._version is None):
+            return self._version
+        try:
+            now = time.monotonic()
+            if self._version is not None and now - self._version_checked < self.version_ttl:
+                return self._version
+            _, rows = self._execute(
+                """
+                SELECT
+                    (SELECT concat_ws(':', relid, n_tup_ins, n_tup_upd, n_tup_del)
+                     FROM pg_stat_user_tables
+                     WHERE relid = %s::regclass
+                       AND n_tup_ins IS NOT NULL
+                       AND current_setting('track_counts')::bool),
+                    (SELECT md5(string_agg(viewname || pg_get_viewdef(viewname::regclass), ',' ORDER BY viewname))
+                     FROM pg_views WHERE viewname = ANY(%s))
+                """,
+                (SOURCE_TABLE, VIEWS),
+                slots=self._probe_slot,
+            )
+            counters, view_defs = rows[0]
+            if counters is None:
+                # Without counters changes are invisible; expire the version
+                # on a timer rather than serving stale data indefinitely
+                if not self._warned_untracked:
+                    print('warning: no write counters for %s (track_counts off?); '
+                          'data version expires every %ds' % (SOURCE_TABLE, UNTRACKED_VERSION_TTL),
+                          file=sys.stderr)
+                    self._warned_untracked = True
+                counters = 'untracked:%d' % (time.time() // UNTRACKED_VERSION_TTL)
+            digest = hashlib.sha1(('%s|%s' % (counters, view_defs)).encode()).hexdigest()
+            self._version = digest[:16]
+            self._version_checked = now
+            return self._version
+        finally:
+            self._version_lock.release()
+
+    def column_types(self, view, version):
+        """Column name -> SQL type of a view, cached per data version"""
+        cached = self._column_types.get(view)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        _, rows = self._execute(
+            """
+            SELECT attname, format_type(atttypid, atttypmod)
+            FROM pg_attribute
+            WHERE attrelid = %s::regclass AND attnum > 0 AND NOT attisdropped
+            ORDER BY attnum
+            """,
+            (view,),
+        )
+        types = dict(rows)
+        self._column_types[view] = (version, types)
+        return types
+
+    def build_query(self, view, params, column_types):
+        """Turn request parameters into a parameterized SELECT on the view"""
+        if view not in VIEWS:
+            raise NotFound('unknown view %r' % view)
+
+        def check(column):
+            if column not in column_types:
+                raise BadRequest('unknown column %r for %s' % (column, view))
+            return column
+
+        columns = params.get('columns')
+        if columns:
+            names = [check(c.strip()) for c in columns[0].split(',') if c.strip()]
+            if not names:
+                raise BadRequest('columns must name at least one column')
+            select = sql.SQL(', ').join(sql.Identifier(c) for c in names)
+        else:
+            select = sql.SQL('*')
+
+        query = sql.SQL('SELECT {} FROM {}').format(select, sql.Identifier(view))
+        args = []
+
+        filters = sorted((k, v) for k, v in params.items() if k not in RESERVED_PARAMS)
+        if filters:
+            conditions = []
+            for column, values in filters:
+                # Cast the parameter to the column's type so ?price=10 matches 10.00
+                col_type = sql.SQL(column_types[check(column)])
+                if len(values) == 1:
+                    conditions.append(sql.SQL('{} = %s::{}').format(sql.Identifier(column), col_type))
+                    args.append(values[0])
+                else:
+                    conditions.append(sql.SQL('{} = ANY(%s::{}[])').format(sql.Identifier(column), col_type))
+                    args.append(list(values))
+            query += sql.SQL(' WHERE ') + sql.SQL(' AND ').join(conditions)
+
+        order_by = params.get('order_by')
+        if order_by:
+            direction = params.get('order', ['asc'])[0].lower()
+            if direction not in ('asc', 'desc'):
+                raise BadRequest("order must be 'asc' or 'desc'")
+            query += sql.SQL(' ORDER BY {} {} NULLS LAST').format(
+                sql.Identifier(check(order_by[0])), sql.SQL(direction.upper()))
+
+        limit = params.get('limit')
+        if limit:
+            try:
+                n = int(limit[0])
+            except ValueError:
+                raise BadRequest('limit must be an integer')
+            if not 0 <= n <= MAX_LIMIT:
+                raise BadRequest('limit must be between 0 and %d' % MAX_LIMIT)
+            query += sql.SQL(' LIMIT %s')
+            args.append(n)
+
+        return query, args
+
+    def fetch(self, view, params, fmt, version):
+        """Serialized result for a request, from cache or Postgres"""
+        key = (version, view, canonical_params(params), fmt)
+        with self._counters_lock:
+            self.requests += 1
+        body = self.cache.get(key)
+        if body is not None:
+            return body
+
+        def load():
+            # Another request may have filled the cache while we queued; peek
+            # so this request isn't counted as a second miss
+            cached = self.cache.peek(key)
+            if cached is not None:
+                return cached
+            query, args = self.build_query(view, params, self.column_types(view, version))
+            with self._counters_lock:
+                self.queries += 1
+            fields, rows = self._execute(query, args)
+            if fmt == 'arrow':
+                payload = to_arrow(fields, rows)
+            else:
+                payload = to_json([name for name, _ in fields], rows)
+            self.cache.put(key, payload)
+            return payload
+
+        return self.flight.do(key, load)
+
+    def stats(self):
+        """Counters for /stats.
+
+        cache.hit_rate counts only requests answered straight from the cache;
+        coalesced followers are cache misses there and are reported separately.
+        served_without_query_rate counts every request that did not run its
+        own Postgres query (cache hits plus coalesced followers).
+        """
+        with self._counters_lock:
+            requests, queries = self.requests, self.queries
+        return {
+            'cache': self.cache.stats(),
+            'requests': requests,
+            'coalesced_requests': self.flight.coalesced,
+            'postgres_queries': queries,
+            'served_without_query_rate': round(1 - queries / requests, 4) if requests else 0.0,
+            'data_version': self._version,
+        }
+
+
+def canonical_params(params):
+    """Hashable form of the query parameters, independent of parameter order.
+
+    Repeated filter values are sorted since they become one ANY(...) match;
+    reserved parameters such as columns keep their order.
+    """
+    return tuple(sorted(
+        (k, tuple(v) if k in RESERVED_PARAMS else tuple(sorted(v)))
+        for k, v in params.items() if k != 'format'
+    ))
+
+
+def _json_default(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    raise TypeError('Cannot serialize %r' % type(value))
+
+
+def to_json(columns, rows):
+    """Rows as a JSON array of records"""
+    records = [dict(zip(columns, row)) for row in rows]
+    return json.dumps(records, default=_json_default, separators=(',', ':')).encode()
+
+
+def arrow_schema(fields):
+    """Arrow schema for (name, type OID) pairs from cursor.description"""
+    return pa.schema([(name, PG_ARROW_TYPES.get(oid, pa.string())) for name, oid in fields])
+
+
+def to_arrow(fields, rows):
+    """Rows as an Arrow IPC stream, typed from the result description"""
+    schema = arrow_schema(fields)
+    arrays = []
+    for i, field in enumerate(schema):
+        values = [row[i] for row in rows]
+        if pa.types.is_floating(field.type):
+            values = [None if v is None else float(v) for v in values]
+        elif pa.types.is_string(field.type):
+            values = [None if v is None else str(v) for v in values]
+        arrays.append(pa.array(values, type=field.type))
+    table = pa.Table.from_arrays(arrays, schema=schema)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def make_etag(version, view, params, fmt):
+    digest = hashlib.sha1(repr((view, canonical_params(params), fmt)).encode()).hexdigest()
+    return '"%s-%s"' % (version, digest[:16])
+
+
+def etag_matches(header, etag):
+    if not header:
+        return False
+    if header.strip() == '*':
+        return True
+    tags = [t.strip() for t in header.split(',')]
+    return etag in tags or ('W/' + etag) in tags
+
+
+class Handler(BaseHTTPRequestHandler):
+    """HTTP front end for a DataService"""
+
+    service = None
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        parts = [p for p in url.path.split('/') if p]
+
+        try:
+            if parts == ['views']:
+                self._send_json(200, {'views': VIEWS})
+            elif parts == ['stats']:
+                self._send_json(200, self.service.stats())
+            elif len(parts) == 2 and parts[0] == 'views':
+                self._serve_view(parts[1], parse_qs(url.query))
+            else:
+                self._send_json(404, {'error': 'not found'})
+        except NotFound as exc:
+            self._send_json(404, {'error': str(exc)})
+        except BadRequest as exc:
+            self._send_json(400, {'error': str(exc)})
+        except (psycopg2.errors.UndefinedColumn, psycopg2.errors.SyntaxError, psycopg2.DataError) as exc:
+            self._send_json(400, {'error': exc.pgerror.strip() if exc.pgerror else str(exc)})
+        except psycopg2.Error as exc:
+            self.log_error('database error: %s', exc)
+            self._send_json(503, {'error': 'database unavailable'})
+        except (BrokenPipeError, ConnectionResetError):
+            # Client went away mid-response; there is no one to answer
+            self.close_connection = True
+        except Exception as exc:
+            self.log_error('internal error: %r', exc)
+            self._send_json(500, {'error': 'internal error'})
+
+    def _serve_view(self, view, params):
+        if view not in VIEWS:
+            raise NotFound('unknown view %r' % view)
+
+        fmt = params.get('format', [None])[0]
+        if fmt is None:
+            fmt = 'arrow' if ARROW_MIME in self.headers.get('Accept', '') else 'json'
+        if fmt not in ('json', 'arrow'):
+            raise BadRequest("format must be 'json' or 'arrow'")
+
+        version = self.service.data_version()
+        etag = make_etag(version, view, params, fmt)
+        headers = {'ETag': etag, 'Cache-Control': 'no-cache', 'Vary': 'Accept'}
+
+        if etag_matches(self.headers.get('If-None-Match'), etag):
+            self._send(304, b'', None, headers)
+            return
+
+        body = self.service.fetch(view, params, fmt, version)
+        self._send(200, body, ARROW_MIME if fmt == 'arrow' else JSON_MIME, headers)
+
+    def _send_json(self, status, payload):
+        self._send(status, json.dumps(payload).encode(), JSON_MIME)
+
+    def _send(self, status, body, content_type, headers=None):
+        self.send_response(status)
+        if content_type:
+            self.send_header('Content-Type', content_type)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if body:
+            self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        if os.environ.get('SERVICE_ACCESS_LOG'):
+            super().log_message(format, *args)
+
+
+class Server(ThreadingHTTPServer):
+    """Threaded HTTP server with a listen backlog sized for many clients"""
+
+    daemon_threads = True
+    # socketserver's default backlog of 5 drops SYNs under concurrent load,
+    # which clients see as ~1s stalls while they retransmit
+    request_queue_size = 128
+
+
+def init_pool(max_connections):
+    """Pool of read-only connections: max_connections for view queries plus
+    one reserved for the data version probe"""
+    size = max_connections + 1
+    # minconn == maxconn so returned connections are kept rather than closed
+    return psycopg2.pool.ThreadedConnectionPool(size, size, **db_config())
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Read-only data service over the reporting views')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8600)
+    parser.add_argument('--max-connections', type=int, default=4,
+                        help='Postgres connections for view queries (caps load on the database; '
+                             'one more is reserved for data version checks)')
+    parser.add_argument('--cache-mb', type=float, default=256,
+                        help='Result cache size in megabytes')
+    parser.add_argument('--version-ttl', type=float, default=2.0,
+                        help='Seconds between data version checks')
+    args = parser.parse_args()
+
+    pool = init_pool(args.max_connections)
+    cache = LRUCache(int(args.cache_mb * 1024 * 1024))
+    Handler.service = DataService(pool, cache, version_ttl=args.version_ttl)
+
+    server = Server((args.host, args.port), Handler)
+    print('Serving %d views on http://%s:%d' % (len(VIEWS), args.host, args.port))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        pool.closeall()
+
+
+if __name__ == '__main__':
+    main()
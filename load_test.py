@@ -0,0 +1,144 @@
+"""Concurrent load test for data_service.py.
+
+Runs N client threads against a running service for a fixed duration and
+reports throughput, latency percentiles, status codes and the server's cache
+hit rate / coalescing counters.
+
+Run:
+    python load_test.py --url http://127.0.0.1:8600 --clients 32 --duration 30
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+from collections import Counter
+from urllib.error import HTTPError
+from urllib.request import Request, urlopen
+
+# Mix of full views and parameterized top-N / filter queries
+DEFAULT_PATHS = [
+    '/views/category_performance',
+    '/views/store_performance',
+    '/views/top_sellers?format=arrow',
+    '/views/top_revenue_products',
+    '/views/cluster_summary?format=arrow',
+    '/views/revenue_curve?order_by=revenue&order=desc&limit=50',
+    '/views/performance_ranked?order_by=performance_score&order=desc&limit=100&format=arrow',
+    '/views/performance_ranked?category=Clothing&limit=20',
+    '/views/stock_risk_dashboard?price_segment=High&order_by=stock_risk&limit=100',
+]
+
+
+def worker(base_url, paths, deadline, revalidate, results, lock):
+    """Issue requests until the deadline, optionally sending If-None-Match"""
+    etags = {}
+    latencies = []
+    statuses = Counter()
+    bytes_read = 0
+
+    while time.monotonic() < deadline:
+        path = random.choice(paths)
+        request = Request(base_url + path)
+        if revalidate and path in etags:
+            request.add_header('If-None-Match', etags[path])
+
+        start = time.perf_counter()
+        try:
+            with urlopen(request, timeout=60) as response:
+                body = response.read()
+                status = response.status
+                etag = response.headers.get('ETag')
+        except HTTPError as exc:
+            body = exc.read()
+            status = exc.code
+            etag = exc.headers.get('ETag')
+        except OSError:
+            body, status, etag = b'', 'error', None
+        latencies.append(time.perf_counter() - start)
+
+        statuses[status] += 1
+        bytes_read += len(body)
+        if etag:
+            etags[path] = etag
+
+    with lock:
+        results['latencies'].extend(latencies)
+        results['statuses'].update(statuses)
+        results['bytes'] += bytes_read
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def fetch_stats(base_url):
+    with urlopen(base_url + '/stats', timeout=10) as response:
+        return json.loads(response.read())
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test the reporting data service')
+    parser.add_argument('--url', default='http://127.0.0.1:8600')
+    parser.add_argument('--clients', type=int, default=32)
+    parser.add_argument('--duration', type=float, default=30, help='Seconds to run')
+    parser.add_argument('--no-revalidate', action='store_true',
+                        help="Don't send If-None-Match (measure the result cache alone)")
+    args = parser.parse_args()
+
+    base_url = args.url.rstrip('/')
+    before = fetch_stats(base_url)
+
+    results = {'latencies': [], 'statuses': Counter(), 'bytes': 0}
+    lock = threading.Lock()
+    deadline = time.monotonic() + args.duration
+    threads = [
+        threading.Thread(target=worker,
+                         args=(base_url, DEFAULT_PATHS, deadline, not args.no_revalidate, results, lock))
+        for _ in range(args.clients)
+    ]
+
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+
+    after = fetch_stats(base_url)
+    latencies = results['latencies']
+    total = len(latencies)
+
+    hits = after['cache']['hits'] - before['cache']['hits']
+    misses = after['cache']['misses'] - before['cache']['misses']
+    not_modified = results['statuses'].get(304, 0)
+    requests = after['requests'] - before['requests']
+    queries = after['postgres_queries'] - before['postgres_queries']
+
+    print('Clients:            %d' % args.clients)
+    print('Duration:           %.1fs' % elapsed)
+    print('Requests:           %d' % total)
+    print('Throughput:         %.1f req/s' % (total / elapsed if elapsed else 0))
+    print('Transfer:           %.2f MB/s' % (results['bytes'] / elapsed / 1e6 if elapsed else 0))
+    print('Latency p50/p95/p99: %.1f / %.1f / %.1f ms' % (
+        percentile(latencies, 50) * 1000,
+        percentile(latencies, 95) * 1000,
+        percentile(latencies, 99) * 1000,
+    ))
+    print('Status codes:       %s' % dict(results['statuses']))
+    print('304 Not Modified:   %.1f%%' % (100.0 * not_modified / total if total else 0))
+    print('Cache hits:         %d / %d (%.1f%%)' % (
+        hits, hits + misses, 100.0 * hits / (hits + misses) if hits + misses else 0))
+    print('Coalesced requests: %d' % (after['coalesced_requests'] - before['coalesced_requests']))
+    print('Postgres queries:   %d' % queries)
+    print('Served w/o query:   %.1f%% of %d non-304 requests' % (
+        100.0 * (requests - queries) / requests if requests else 0, requests))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,286 @@
+"""Tests for the database-free parts of data_service.py"""
+
+import sys
+import threading
+import time
+from decimal import Decimal
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip('psycopg2')
+pa = pytest.importorskip('pyarrow')
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import data_service as ds  # noqa: E402
+
+TYPES = {'category': 'text', 'price': 'numeric', 'units_sold': 'integer'}
+
+
+def make_service(max_bytes=1024):
+    return ds.DataService(SimpleNamespace(maxconn=2), ds.LRUCache(max_bytes))
+
+
+# LRUCache
+
+def test_cache_evicts_least_recently_used_by_bytes():
+    cache = ds.LRUCache(10)
+    cache.put('a', b'12345')
+    cache.put('b', b'12345')
+    cache.get('a')
+    cache.put('c', b'1')
+
+    assert cache.peek('a') == b'12345'
+    assert cache.peek('b') is None
+    assert cache.peek('c') == b'1'
+    assert cache.stats()['bytes'] == 6
+    assert cache.stats()['evictions'] == 1
+
+
+def test_cache_skips_oversized_values():
+    cache = ds.LRUCache(4)
+    cache.put('a', b'123')
+    cache.put('big', b'12345')
+
+    assert cache.peek('big') is None
+    assert cache.peek('a') == b'123'
+
+
+def test_cache_peek_does_not_count():
+    cache = ds.LRUCache(10)
+    cache.put('a', b'1')
+    cache.peek('a')
+    cache.peek('missing')
+
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses']) == (0, 0)
+
+
+# SingleFlight
+
+def test_single_flight_coalesces_concurrent_calls():
+    flight = ds.SingleFlight()
+    calls = []
+
+    def slow():
+        calls.append(1)
+        time.sleep(0.2)
+        return b'x'
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(flight.do('k', slow))) for _ in range(5)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(calls) == 1
+    assert results == [b'x'] * 5
+    assert flight.coalesced == 4
+
+
+def test_single_flight_propagates_errors_and_clears_key():
+    flight = ds.SingleFlight()
+
+    def fail():
+        raise ds.BadRequest('boom')
+
+    with pytest.raises(ds.BadRequest):
+        flight.do('k', fail)
+    assert flight.do('k', lambda: b'ok') == b'ok'
+
+
+# DataService
+
+def test_fetch_counts_one_miss_per_query():
+    service = make_service()
+    service.column_types = lambda view, version: TYPES
+    calls = []
+
+    def execute(query, params=None):
+        calls.append(query)
+        time.sleep(0.2)
+        return [('category', 25)], [('Clothing',)]
+
+    service._execute = execute
+    threads = [
+        threading.Thread(target=service.fetch, args=('top_sellers', {}, 'json', 'v1'))
+        for _ in range(5)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    service.fetch('top_sellers', {}, 'json', 'v1')
+
+    stats = service.stats()
+    assert len(calls) == 1
+    assert stats['postgres_queries'] == 1
+    assert stats['requests'] == 6
+    assert stats['cache']['hits'] == 1
+    assert stats['cache']['misses'] == 5
+    assert stats['coalesced_requests'] == 4
+    assert stats['served_without_query_rate'] == round(5 / 6, 4)
+
+
+def test_build_query_casts_filters_to_column_type():
+    service = make_service()
+    query, args = service.build_query(
+        'top_sellers', {'price': ['10'], 'category': ['A', 'B'], 'limit': ['5']}, TYPES)
+
+    assert args == [['A', 'B'], '10', 5]
+    conditions = [part for part in query if isinstance(part, ds.sql.Composed)]
+    assert conditions == [
+        ds.sql.Composed([ds.sql.Identifier('category'), ds.sql.SQL(' = ANY(%s::'),
+                         ds.sql.SQL('text'), ds.sql.SQL('[])')]),
+        ds.sql.Composed([ds.sql.Identifier('price'), ds.sql.SQL(' = %s::'), ds.sql.SQL('numeric')]),
+    ]
+
+
+@pytest.mark.parametrize('params', [
+    {'columns': ['nope']},
+    {'columns': [' , ']},
+    {'order_by': ['nope']},
+    {'order_by': ['price'], 'order': ['sideways']},
+    {'': ['x']},
+    {'limit': ['ten']},
+    {'limit': ['-1']},
+    {'limit': [str(ds.MAX_LIMIT + 1)]},
+])
+def test_build_query_rejects_bad_input(params):
+    with pytest.raises(ds.BadRequest):
+        make_service().build_query('top_sellers', params, TYPES)
+
+
+def test_build_query_rejects_unknown_view():
+    with pytest.raises(ds.NotFound):
+        make_service().build_query('inventory', {}, TYPES)
+
+
+class FakeCursor:
+    description = [('counters', 25), ('view_defs', 25)]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, query, params=None):
+        pass
+
+    def fetchall(self):
+        return [('1:2:3:4', 'defs')]
+
+
+class FakePool:
+    maxconn = 2
+
+    def getconn(self):
+        return SimpleNamespace(autocommit=False, cursor=FakeCursor, rollback=lambda: None)
+
+    def putconn(self, conn):
+        pass
+
+
+def test_data_version_does_not_wait_for_busy_query_slots():
+    service = ds.DataService(FakePool(), ds.LRUCache(1024))
+    service._version, service._version_checked = 'stale', 0.0
+    for _ in range(FakePool.maxconn - 1):
+        service._slots.acquire()
+
+    result = []
+    probe = threading.Thread(target=lambda: result.append(service.data_version()), daemon=True)
+    probe.start()
+    probe.join(0.5)
+
+    assert not probe.is_alive()
+    assert result[0] not in ('stale', None)
+
+
+def test_data_version_serves_current_version_while_refreshing():
+    service = ds.DataService(FakePool(), ds.LRUCache(1024))
+    service._version, service._version_checked = 'current', 0.0
+
+    with service._version_lock:
+        start = time.monotonic()
+        assert service.data_version() == 'current'
+        assert time.monotonic() - start < 0.5
+
+
+# Handler
+
+class BrokenWriter:
+    def __init__(self):
+        self.writes = 0
+
+    def write(self, data):
+        self.writes += 1
+        raise BrokenPipeError()
+
+    def flush(self):
+        pass
+
+
+def test_handler_gives_up_quietly_when_client_disconnects():
+    handler = ds.Handler.__new__(ds.Handler)
+    handler.path = '/views'
+    handler.request_version = 'HTTP/1.1'
+    handler.requestline = 'GET /views HTTP/1.1'
+    handler.command = 'GET'
+    handler.client_address = ('127.0.0.1', 0)
+    handler.wfile = BrokenWriter()
+    errors = []
+    handler.log_error = lambda *args: errors.append(args)
+
+    handler.do_GET()
+
+    assert handler.wfile.writes == 1
+    assert handler.close_connection
+    assert errors == []
+
+
+# Helpers
+
+def test_canonical_params_ignores_order_and_format():
+    a = ds.canonical_params({'limit': ['5'], 'category': ['A', 'B'], 'format': ['arrow']})
+    b = ds.canonical_params({'category': ['B', 'A'], 'limit': ['5']})
+    assert a == b
+
+
+def test_canonical_params_keeps_column_order():
+    a = ds.canonical_params({'columns': ['price,category']})
+    b = ds.canonical_params({'columns': ['category,price']})
+    assert a != b
+
+
+def test_etag_depends_on_version_and_format():
+    params = {'limit': ['5']}
+    etag = ds.make_etag('v1', 'top_sellers', params, 'json')
+
+    assert etag != ds.make_etag('v2', 'top_sellers', params, 'json')
+    assert etag != ds.make_etag('v1', 'top_sellers', params, 'arrow')
+
+
+@pytest.mark.parametrize('header, expected', [
+    (None, False),
+    ('', False),
+    ('*', True),
+    ('"x"', True),
+    ('"a", "x"', True),
+    ('W/"x"', True),
+    ('"y"', False),
+])
+def test_etag_matches(header, expected):
+    assert ds.etag_matches(header, '"x"') is expected
+
+
+def test_to_arrow_keeps_schema_for_empty_and_null_results():
+    fields = [('price', 1700), ('units_sold', 23), ('category', 25)]
+    expected = pa.schema([('price', pa.float64()), ('units_sold', pa.int32()), ('category', pa.string())])
+
+    for rows in ([(Decimal('1.50'), 3, 'A')], [], [(None, None, None)]):
+        table = pa.ipc.open_stream(ds.to_arrow(fields, rows)).read_all()
+        assert table.schema == expected